@@ -0,0 +1,64 @@
+"""Shared connection settings for the pipeline scripts.
+
+Everything reads SSH/DB settings from the environment (or a `.env` file) with the
+same defaults, and exposes them as argparse flags so they can be overridden per run.
+This module only imports the standard library so `--help` stays fast.
+"""
+import argparse
+import logging
+import os
+
+
+def load_env() -> None:
+    """Load a `.env` file into the environment if python-dotenv is installed."""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def add_connection_args(ap: argparse.ArgumentParser) -> None:
+    """Add the SSH/DB flags; defaults come from SSH_* / DB_* environment variables."""
+    load_env()
+    ap.add_argument("--ssh-host", default=os.getenv("SSH_HOST", "10.10.219.8"))
+    ap.add_argument("--ssh-user", default=os.getenv("SSH_USER", "moxy"))
+    ap.add_argument("--ssh-port", type=int, default=int(os.getenv("SSH_PORT", "22")))
+    ap.add_argument("--ssh-password", default=os.getenv("SSH_PASSWORD"))  # $env:SSH_PASSWORD="your-ssh-password"
+    ap.add_argument("--ssh-pkey", default=os.getenv("SSH_PKEY"), help="Private key file (used instead of a password).")
+
+    ap.add_argument("--db-user", default=os.getenv("DB_USER", "appuser"))
+    ap.add_argument("--db-password", default=os.getenv("DB_PASSWORD", "devpassword"))
+    ap.add_argument("--db-name", default=os.getenv("DB_NAME", "ecommerce"))
+    ap.add_argument("--db-port", type=int, default=int(os.getenv("DB_PORT", "5432")))
+
+
+def add_verbosity_args(ap: argparse.ArgumentParser) -> None:
+    verbosity = ap.add_mutually_exclusive_group()
+    verbosity.add_argument("--verbose", action="store_true", help="Enable debug logging")
+    verbosity.add_argument("--quiet", action="store_true", help="Show warnings and errors only")
+
+
+def configure_logging(args: argparse.Namespace) -> None:
+    log_level = logging.INFO
+    if getattr(args, "verbose", False):
+        log_level = logging.DEBUG
+    elif getattr(args, "quiet", False):
+        log_level = logging.WARNING
+    logging.basicConfig(level=log_level, format="%(levelname)s %(message)s")
+
+
+def session_kwargs(args: argparse.Namespace, *, want_sftp: bool = False) -> dict:
+    """Build keyword arguments for `helpers.open_remote_session` from parsed flags."""
+    return dict(
+        ssh_host=args.ssh_host,
+        ssh_user=args.ssh_user,
+        ssh_password=args.ssh_password,
+        ssh_pkey=args.ssh_pkey,
+        ssh_port=args.ssh_port,
+        db_name=args.db_name,
+        db_user=args.db_user,
+        db_pass=args.db_password,
+        db_port=args.db_port,
+        want_sftp=want_sftp,
+    )
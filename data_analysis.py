@@ -1,65 +1,35 @@
-# %% setup
+import argparse
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
+from config import add_connection_args, session_kwargs
 from helpers import open_remote_session, run_query
+import queries
 
-# lets us use .env file for secrets
-from dotenv import load_dotenv
-load_dotenv()
-
-# %% quick test query
-with open_remote_session(
-    ssh_host="10.10.219.8",
-    ssh_user="moxy",
-    ssh_password=os.environ["SSH_PASSWORD"],  # $env:SSH_PASSWORD="your-ssh-password"
-    db_name="ecommerce",
-    db_user="appuser",
-    db_pass="devpassword",
-    want_sftp=False,
-) as session:
-    conn = session.conn
+
+def run_analysis(conn, *, charts_dir: str = "charts", show: bool = False) -> None:
+    """Print the summary tables and save the charts under `charts_dir`."""
+    # Plotting stack is only needed here, not for the other subcommands
+    import matplotlib
+    if not show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    os.makedirs(charts_dir, exist_ok=True)
 
     ## User Type Counts with Bar Chart visual
-    df_users = run_query(conn, """
-                            SELECT user_type, COUNT(*) AS count
-                            FROM users
-                            GROUP BY user_type
-                            ORDER BY count DESC;""", as_df=True)
+    df_users = run_query(conn, queries.USER_TYPE_COUNTS, as_df=True)
     print(df_users)
     ## Top 10 spenders
-    df_spenders = run_query(conn, """
-                            SELECT first_name, last_name, total_spent
-                            FROM users
-                            ORDER BY total_spent DESC
-                            LIMIT 20; """, as_df=True, limit = None)
+    df_spenders = run_query(conn, queries.TOP_SPENDERS, as_df=True, limit = None)
     print(df_spenders)
 
     ## Device/browser distribution
-    df_device = run_query(conn, """
-              SELECT last_device, COUNT(*) as count
-              FROM users
-              GROUP BY last_device
-              ORDER BY count DESC;""",as_df=True)
+    df_device = run_query(conn, queries.DEVICE_COUNTS, as_df=True)
     print(df_device)
     ## Top 5 categories by revenue
-    df_revenue= run_query(conn, """
-              SELECT product_category, SUM(total_price) AS sum_total_price
-              FROM purchases
-              GROUP BY product_category
-              ORDER BY sum_total_price DESC
-              LIMIT 5;
-              """,as_df=True)
+    df_revenue= run_query(conn, queries.TOP_CATEGORY_REVENUE, as_df=True)
     print(df_revenue)
     ## Monthly revenue trend (2023-2024)
-    df_monthly = run_query(conn, """
-              SELECT DATE_TRUNC('month', purchase_date)::date AS month,
-              SUM(COALESCE(total_price, 0)) AS revenue
-              FROM purchases
-              WHERE EXTRACT(YEAR FROM purchase_date) = 2023
-              OR EXTRACT(YEAR FROM purchase_date) =2024
-              GROUP BY month
-              ORDER BY month;""", as_df=True, limit =None)
+    df_monthly = run_query(conn, queries.MONTHLY_REVENUE, as_df=True, limit =None)
     print(df_monthly)
 
     ## Plots
@@ -69,7 +39,7 @@ with open_remote_session(
     plt.title("Top 5 Categories by Revenue")
     plt.ylabel("Revenue")
     plt.xlabel("Category")
-    plt.savefig("charts/bar_revenue_by_category.png")
+    plt.savefig(os.path.join(charts_dir, "bar_revenue_by_category.png"))
     plt.close()
 
     ## Line Chart: Monthly Revenue
@@ -77,31 +47,43 @@ with open_remote_session(
     plt.title("Revenue over time (Jan 2023-Dec 2024)")
     plt.xlabel("Date")
     plt.ylabel("Revenue")
-    plt.savefig("charts/line_revenue_overtime")
+    plt.savefig(os.path.join(charts_dir, "line_revenue_overtime"))
     plt.close()
 
     ## Pie Chart: User types (%)
     plt.pie(df_users['count'], labels = df_users['user_type'])
     plt.title("Percentage of user type")
-    plt.savefig("charts/pie_usertype_pct")
+    plt.savefig(os.path.join(charts_dir, "pie_usertype_pct"))
     plt.close()
 
     ## Histogram: Total Spending Distribution
-    df_spenders = run_query(conn, """
-    SELECT COALESCE(total_spent, 0) AS total_spent
-    FROM users;""", as_df=True, limit=None)
+    df_spenders = run_query(conn, queries.SPENDING_DISTRIBUTION, as_df=True, limit=None)
 
     # visual
     plt.hist(df_spenders["total_spent"], bins=30, edgecolor="black")
     plt.xlabel("Total Spent")
     plt.ylabel("Number of users")
     plt.title("Distribution of Total Spending")
-    plt.savefig("charts/hist_total_spending.png", dpi=140)
+    plt.savefig(os.path.join(charts_dir, "hist_total_spending.png"), dpi=140)
     plt.close()
 
     ## Pie chart of device distribution
     plt.pie(df_device['count'], labels = df_device['last_device'])
     plt.title("Percentage of device types")
-    plt.savefig("charts/pie_devicetype_pct")
-    plt.show()
-    
\ No newline at end of file
+    plt.savefig(os.path.join(charts_dir, "pie_devicetype_pct"))
+    if show:
+        plt.show()
+    plt.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Print summary tables and save charts.")
+    add_connection_args(ap)
+    args = ap.parse_args()
+
+    with open_remote_session(**session_kwargs(args)) as session:
+        run_analysis(session.conn, show=True)
+
+
+if __name__ == "__main__":
+    main()
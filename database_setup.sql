@@ -27,7 +27,9 @@ CREATE TABLE raw.users_raw (
     created_date TEXT,
     generated_at TEXT,
     purchase_count TEXT,
-    total_spent TEXT
+    total_spent TEXT,
+    -- load order, so the transform can keep the newest row per email
+    load_seq BIGSERIAL
 );
 
 -- PURCHASES_RAW
@@ -51,6 +53,14 @@ CREATE TABLE raw.purchases_raw (
     year TEXT
 );
 
+-- LOADED_FILES (remote CSVs already copied into raw.*; kept across schema re-runs)
+CREATE TABLE IF NOT EXISTS raw.loaded_files (
+    path TEXT PRIMARY KEY,
+    size BIGINT,
+    mtime BIGINT,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
 -- USERS
 CREATE TABLE IF NOT EXISTS users (
     email VARCHAR PRIMARY KEY,
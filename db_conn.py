@@ -1,56 +1,35 @@
-import warnings
-try:
-    from cryptography.utils import CryptographyDeprecationWarning
-    warnings.filterwarnings("ignore", category=CryptographyDeprecationWarning)
-except Exception:
-    pass
-
-import os
+import argparse
+from config import add_connection_args, session_kwargs
 from helpers import open_remote_session, run_query
+import queries
 
-# lets us use .env file for secrets
-from dotenv import load_dotenv
-load_dotenv()
 
+def run_checks(conn) -> None:
+    """Print row counts and small previews of the transformed tables."""
+    # Example queries
+    run_query(conn, queries.USERS_COUNT, title="users")
+    run_query(conn, queries.PURCHASES_COUNT, title="purchases")
 
-with open_remote_session(
-    ssh_host="10.10.219.8",
-    ssh_user="moxy",
-    ssh_password=os.environ["SSH_PASSWORD"],  # $env:SSH_PASSWORD="your-ssh-password"
-    db_name="ecommerce",
-    db_user="appuser",
-    db_pass="devpassword",
-    want_sftp=False,
-) as session:
-    conn = session.conn
+    run_query(conn, queries.SAMPLE_USERS, title="Sample users", limit=5)
+    run_query(conn, queries.USERS_BY_TYPE, title="Users by type", limit=20)
 
-    # Example queries
-    run_query(conn, "SELECT COUNT(*) FROM users;", title="users")
-    run_query(conn, "SELECT COUNT(*) FROM purchases;", title="purchases")
-
-    run_query(conn, "SELECT * FROM users LIMIT 5;", title="Sample users", limit=5)
-    run_query(conn, """
-        SELECT user_type, COUNT(*) AS n
-        FROM users
-        GROUP BY user_type
-        ORDER BY n DESC;
-    """, title="Users by type", limit=20)
-
-    run_query(conn, """
-        SELECT product_category, COUNT(*) AS n
-        FROM purchases
-        GROUP BY product_category
-        ORDER BY n DESC;
-    """, title="Top categories", limit=15)
-
-    run_query(conn, """
-        SELECT purchase_date, COUNT(*) AS orders
-        FROM purchases
-        GROUP BY purchase_date
-        ORDER BY purchase_date
-        LIMIT 15;
-    """, title="First 15 days")
+    run_query(conn, queries.TOP_CATEGORIES, title="Top categories", limit=15)
+
+    run_query(conn, queries.FIRST_DAYS, title="First 15 days")
 
     # Saving as a pandas DataFrame and explicitly printing
-    df_users = run_query(conn, "SELECT * FROM users LIMIT 5;", as_df=True)
-    print(df_users)
\ No newline at end of file
+    df_users = run_query(conn, queries.SAMPLE_USERS, as_df=True)
+    print(df_users)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Quick row counts and previews.")
+    add_connection_args(ap)
+    args = ap.parse_args()
+
+    with open_remote_session(**session_kwargs(args)) as session:
+        run_checks(session.conn)
+
+
+if __name__ == "__main__":
+    main()
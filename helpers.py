@@ -2,9 +2,19 @@ import textwrap, re, os
 from typing import Any, Iterable, List, Optional, Sequence, Union
 from contextlib import contextmanager
 from types import SimpleNamespace
-from sshtunnel import SSHTunnelForwarder
-import paramiko
-import psycopg2
+
+
+def _silence_paramiko_warnings() -> None:
+    try:
+        import warnings
+        from cryptography.utils import CryptographyDeprecationWarning
+        warnings.filterwarnings(
+            "ignore",
+            category=CryptographyDeprecationWarning,
+            module=r"paramiko.*",
+        )
+    except Exception:
+        pass
 
 @contextmanager
 def open_remote_session(
@@ -20,6 +30,12 @@ def open_remote_session(
     db_port: int = 5432,
     want_sftp: bool = False,  # True for import_data, False for db_conn
 ):
+    # Imported here so scripts that never connect (e.g. `--help`) skip the SSH/DB stack
+    _silence_paramiko_warnings()
+    import paramiko
+    import psycopg2
+    from sshtunnel import SSHTunnelForwarder
+
     tunnel_kwargs = dict(
         ssh_username=ssh_user,
         remote_bind_address=("127.0.0.1", db_port),
@@ -42,6 +58,8 @@ def open_remote_session(
             ssh_client.connect(ssh_host, port=ssh_port, username=ssh_user, pkey=pkey)
         else:
             ssh_client.connect(ssh_host, port=ssh_port, username=ssh_user, password=ssh_password)
+        # keep long-lived sessions (import_data --watch) from being dropped while idle
+        ssh_client.get_transport().set_keepalive(30)
         sftp = ssh_client.open_sftp()
 
     # Tunnel + DB connection
@@ -154,9 +172,13 @@ def _to_df(rows: List[tuple], columns: List[str]):
     return pd.DataFrame.from_records(rows, columns=columns)
 
 
-def execute_sql_text(conn, sql_text: str):
+def split_sql_statements(sql_text: str) -> List[str]:
     cleaned = _strip_sql_comments(sql_text)
-    stmts = [s.strip() for s in cleaned.split(';') if s.strip()]
+    return [s.strip() for s in cleaned.split(';') if s.strip()]
+
+
+def execute_sql_text(conn, sql_text: str):
+    stmts = split_sql_statements(sql_text)
     with conn.cursor() as cur:
         for i, stmt in enumerate(stmts, 1):
             cur.execute(stmt)
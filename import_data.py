@@ -1,40 +1,59 @@
+from __future__ import annotations
+
 import argparse
 import io
 import os
 import posixpath
 import logging
-import warnings
-from typing import Iterable, List
-try:
-    from cryptography.utils import CryptographyDeprecationWarning
-    warnings.filterwarnings(
-        "ignore",
-        category=CryptographyDeprecationWarning,
-        module=r"paramiko.*",
-    )
-except Exception:
-    pass
-import paramiko
-import psycopg2
-from helpers import execute_sql_text, open_remote_session
+import time
+from typing import TYPE_CHECKING, Iterable, List
+from config import add_connection_args, add_verbosity_args, configure_logging, session_kwargs
+from helpers import execute_sql_text, open_remote_session, split_sql_statements
+
+if TYPE_CHECKING:
+    import paramiko
+    import psycopg2.extensions
 
 # Example usage:
 # python .\import_data.py --apply-schema "database_setup.sql" --apply-transform "transform_data.sql" --clear-tables
 
 logger = logging.getLogger(__name__)
 
-
-def list_remote_csvs(sftp: paramiko.SFTPClient, directory: str) -> Iterable[str]:
-    """Yield full remote paths for .csv files within a remote directory."""
+# CSV column order for raw tables that carry extra columns (e.g. raw.users_raw.load_seq),
+# so COPY fills only these and the extras take their defaults
+RAW_CSV_COLUMNS = {
+    "raw.users_raw": (
+        "first_name", "last_name", "email", "password_hash", "phone_number", "date_of_birth",
+        "time_on_app", "user_type", "is_active", "last_payment_method", "reviews", "last_ip",
+        "last_coordinates", "last_device", "last_browser", "last_os", "last_login", "last_logout",
+        "in_cart", "wishlist", "last_search", "created_date", "generated_at", "purchase_count",
+        "total_spent",
+    ),
+}
+
+
+def list_remote_csv_attrs(
+    sftp: paramiko.SFTPClient, directory: str
+) -> Iterable[tuple[str, paramiko.SFTPAttributes]]:
+    """Yield (full remote path, attributes) for .csv files within a remote directory.
+
+    Uses a single `listdir_attr` round trip, so size/mtime come without a stat per file.
+    """
     try:
         for entry in sftp.listdir_attr(directory):
             name = entry.filename
             if name.lower().endswith(".csv"):
-                yield f"{directory.rstrip('/')}/{name}"
+                yield f"{directory.rstrip('/')}/{name}", entry
     except FileNotFoundError:
         logger.warning("[warn] directory not found on server: %s", directory)
 
 
+def list_remote_csvs(sftp: paramiko.SFTPClient, directory: str) -> Iterable[str]:
+    """Yield full remote paths for .csv files within a remote directory."""
+    for path, _ in list_remote_csv_attrs(sftp, directory):
+        yield path
+
+
 def copy_csv_stream(
     cur: psycopg2.extensions.cursor,
     table: str,
@@ -44,12 +63,34 @@ def copy_csv_stream(
     encoding: str = "utf-8",
 ) -> None:
     """Stream a remote CSV file through COPY FROM STDIN into the given table."""
+    columns = RAW_CSV_COLUMNS.get(table)
+    target = f"{table} ({', '.join(columns)})" if columns else table
     with sftp.open(remote_path, "rb") as f_bin:
         f_txt = io.TextIOWrapper(f_bin, encoding=encoding, newline="")  # type: ignore[arg-type]
-        sql = f"COPY {table} FROM STDIN WITH (FORMAT csv, HEADER true)"
+        sql = f"COPY {target} FROM STDIN WITH (FORMAT csv, HEADER true)"
         cur.copy_expert(sql=sql, file=f_txt)
 
 
+def record_loaded_file(cur: psycopg2.extensions.cursor, path: str, sig: tuple[int, int]) -> None:
+    """Upsert a remote file and its (size, mtime) into raw.loaded_files."""
+    cur.execute(
+        """
+        INSERT INTO raw.loaded_files (path, size, mtime) VALUES (%s, %s, %s)
+        ON CONFLICT (path) DO UPDATE SET size = EXCLUDED.size, mtime = EXCLUDED.mtime, loaded_at = now()
+        """,
+        (path, sig[0], sig[1]),
+    )
+
+
+def load_manifest(conn: psycopg2.extensions.connection) -> dict[str, tuple[int, int]]:
+    """Return path -> (size, mtime) for every file recorded in raw.loaded_files."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT path, size, mtime FROM raw.loaded_files;")
+        rows = cur.fetchall()
+    conn.commit()
+    return {path: (int(size), int(mtime)) for path, size, mtime in rows}
+
+
 def _load_directory_into_table(
     conn: psycopg2.extensions.connection,
     sftp: paramiko.SFTPClient,
@@ -57,25 +98,51 @@ def _load_directory_into_table(
     table: str,
     *,
     encoding: str = "utf-8",
+    files: List[tuple[str, tuple[int, int]]] | None = None,
+    loaded_paths: dict[str, tuple[int, int]] | None = None,
 ) -> int:
-    """Load all CSV files from a remote directory into the specified table."""
-    logger.info("[load] scanning %s", directory)
-    files: List[str] = sorted(list_remote_csvs(sftp, directory))
+    """Load all CSV files from a remote directory into the specified table.
+
+    Each file is recorded in raw.loaded_files in the same transaction. Watch mode passes
+    `files` as (path, (size, mtime)) pairs that passed the completeness check instead of
+    scanning, and collects what was loaded in `loaded_paths`.
+    """
+    if files is None:
+        logger.info("[load] scanning %s", directory)
+        files = sorted(
+            (path, (attrs.st_size, attrs.st_mtime)) for path, attrs in list_remote_csv_attrs(sftp, directory)
+        )
     if not files:
         logger.info("[load] no CSV files found in %s", directory)
         return 0
 
     loaded = 0
     with conn.cursor() as cur:
-        for path in files:
+        for path, sig in files:
             logger.info("[load] %s -> %s", path, table)
             copy_csv_stream(cur, table, sftp, path, encoding=encoding)
+            record_loaded_file(cur, path, sig)
             loaded += 1
     conn.commit()
+    if loaded_paths is not None:
+        loaded_paths.update(files)
     logger.info("[load] %s done (%d file(s))", table, loaded)
     return loaded
 
 
+def read_sql_file(sql_path: str | None, *, encoding: str = "utf-8", label: str = "sql") -> str | None:
+    """Return the text of a local SQL file, or None (with a warning) if it is missing."""
+    if not sql_path:
+        return None
+
+    if os.path.isfile(sql_path):
+        with open(sql_path, "r", encoding=encoding) as f:
+            return f.read()
+
+    logger.warning("[%s] local file not found: %s; skipping.", label, sql_path)
+    return None
+
+
 def apply_sql_if_requested(
     conn: psycopg2.extensions.connection,
     sql_path: str | None,
@@ -84,19 +151,14 @@ def apply_sql_if_requested(
     label: str = "sql",
 ) -> bool:
     """Apply a local SQL file if provided. Use `label` for log prefixes (e.g., 'schema' or 'transform')."""
-    if not sql_path:
+    sql_text = read_sql_file(sql_path, encoding=encoding, label=label)
+    if sql_text is None:
         return False
 
-    if os.path.isfile(sql_path):
-        with open(sql_path, "r", encoding=encoding) as f:
-            sql_text = f.read()
-        logger.info("[%s] applying local %s", label, sql_path)
-        execute_sql_text(conn, sql_text)
-        logger.info("[%s] applied", label)
-        return True
-
-    logger.warning("[%s] local file not found: %s; skipping.", label, sql_path)
-    return False
+    logger.info("[%s] applying local %s", label, sql_path)
+    execute_sql_text(conn, sql_text)
+    logger.info("[%s] applied", label)
+    return True
 
 
 def summarize_raw_counts(conn: psycopg2.extensions.connection) -> tuple[int, int]:
@@ -128,10 +190,10 @@ def summarize_public_counts(conn: psycopg2.extensions.connection) -> tuple[int,
 
 
 def truncate_raw_tables(conn: psycopg2.extensions.connection) -> None:
-    """Truncate the raw staging tables used for loading."""
+    """Truncate the raw staging tables and the loaded-files record, so every CSV is loaded again."""
     logger.info("[raw] truncating raw tables…")
     with conn.cursor() as cur:
-        cur.execute("TRUNCATE TABLE raw.users_raw, raw.purchases_raw;")
+        cur.execute("TRUNCATE TABLE raw.users_raw, raw.purchases_raw, raw.loaded_files;")
     conn.commit()
 
 
@@ -142,23 +204,208 @@ def truncate_public_tables(conn: psycopg2.extensions.connection) -> None:
         cur.execute("TRUNCATE TABLE public.purchases, public.users RESTART IDENTITY CASCADE;")
     conn.commit()
 
-def main():
-    ap = argparse.ArgumentParser(
-        description="Stream remote CSVs into Postgres via SSH tunnel.",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-    )
+def poll_completed_csvs(
+    sftp: paramiko.SFTPClient,
+    directory: str,
+    pending: dict[str, tuple[int, int]],
+    done: dict[str, tuple[int, int]],
+) -> List[tuple[str, tuple[int, int]]]:
+    """Return (path, (size, mtime)) for CSVs in `directory` that are new and look fully written.
+
+    A file counts as complete once its size and mtime are unchanged between two polls;
+    `pending` carries the last seen (size, mtime) of files that may still be growing.
+    Files in `done` with the same (size, mtime) are skipped; a rewritten file is loaded again.
+    """
+    completed: List[tuple[str, tuple[int, int]]] = []
+    present = set()
+    for path, attrs in list_remote_csv_attrs(sftp, directory):
+        present.add(path)
+        sig = (attrs.st_size, attrs.st_mtime)
+        if done.get(path) == sig:
+            continue
+        if pending.get(path) == sig:
+            completed.append((path, sig))
+            del pending[path]
+        else:
+            pending[path] = sig
+    # forget files that were removed before they settled
+    prefix = f"{directory.rstrip('/')}/"
+    for path in [p for p in pending if p.startswith(prefix) and p not in present]:
+        del pending[path]
+    return sorted(completed)
+
+
+def session_lost(conn: psycopg2.extensions.connection, sftp: paramiko.SFTPClient | None = None) -> bool:
+    """True when the DB connection or the SSH/SFTP session is actually gone.
+
+    Statement-level errors (timeouts, deadlocks, lock waits) leave the session usable and
+    return False, even though psycopg2 raises them as OperationalError.
+    """
+    if conn.closed:
+        return True
+    if sftp is not None:
+        channel = sftp.get_channel()
+        if channel is None or channel.closed:
+            return True
+        transport = channel.get_transport()
+        if transport is None or not transport.is_active():
+            return True
+    return False
+
 
-    ap.add_argument("--ssh-host", default=os.getenv("SSH_HOST", "10.10.219.8"))
-    ap.add_argument("--ssh-user", default=os.getenv("SSH_USER", "moxy"))
-    ap.add_argument("--ssh-port", type=int, default=int(os.getenv("SSH_PORT", "22")))
-    ap.add_argument("--ssh-password", default=os.getenv("SSH_PASSWORD"))  # $env:SSH_PASSWORD="your-ssh-password"
+def transform_micro_batch(conn: psycopg2.extensions.connection, sql_text: str) -> bool:
+    """Apply the transform and clear raw.* in one transaction, so each batch only sees new rows.
 
-    ap.add_argument("--db-user", default=os.getenv("DB_USER", "appuser"))
-    ap.add_argument("--db-password", default=os.getenv("DB_PASSWORD", "devpassword"))
-    ap.add_argument("--db-name", default=os.getenv("DB_NAME", "ecommerce"))
-    ap.add_argument("--db-port", type=int, default=int(os.getenv("DB_PORT", "5432")))
+    On failure the transaction is rolled back and the raw rows are kept for the next batch.
+    The error is re-raised only if the connection itself is gone.
+    """
+    import psycopg2
 
-    ap.add_argument("--remote-root", default=os.getenv("REMOTE_ROOT", "/home/moxy/simple_pipeline")) 
+    try:
+        with conn.cursor() as cur:
+            for stmt in split_sql_statements(sql_text):
+                cur.execute(stmt)
+            cur.execute("TRUNCATE TABLE raw.users_raw, raw.purchases_raw;")
+        conn.commit()
+    except psycopg2.Error as e:
+        if session_lost(conn):
+            raise
+        conn.rollback()
+        logger.error("[watch] transform failed, keeping raw rows for the next batch: %s", str(e).strip())
+        return False
+    return True
+
+
+def watch_directories(
+    conn: psycopg2.extensions.connection,
+    sftp: paramiko.SFTPClient,
+    targets: List[tuple[str, str]],
+    *,
+    loaded: dict[str, tuple[int, int]],
+    pending: dict[str, tuple[int, int]] | None = None,
+    transform_sql: str | None = None,
+    poll_interval: float = 10.0,
+    batch_files: int = 20,
+    max_batch_latency: float = 60.0,
+    max_retries: int = 3,
+    encoding: str = "utf-8",
+) -> int:
+    """Poll (directory, table) targets on an open session and stream new CSVs into raw.*.
+
+    Each completed file is copied, recorded in raw.loaded_files and committed on its own;
+    `loaded` holds the (size, mtime) of files already done. When `transform_sql` is given,
+    loaded files are transformed in micro-batches: as soon as `batch_files` files are
+    waiting, or `max_batch_latency` seconds after the first one was loaded. Runs until
+    interrupted (Ctrl+C) and returns the number of files loaded.
+
+    A file whose load fails is retried on later polls, up to `max_retries` times. A failed
+    transform is retried once per `max_batch_latency`; after `max_retries` failures in a row
+    the watcher stops with RuntimeError, leaving the rows in raw.*. Errors are re-raised
+    immediately only when `session_lost` reports the DB connection or SSH session is gone.
+    """
+    import paramiko
+    import psycopg2
+
+    pending = {} if pending is None else pending
+    load_failures: dict[str, int] = {}
+    batch_count = 0
+    batch_started: float | None = None
+    transform_failures = 0
+    retry_at = 0.0
+    total = 0
+
+    def flush(force: bool = False) -> None:
+        nonlocal batch_count, batch_started, transform_failures, retry_at
+        if not transform_sql or not batch_count:
+            return
+        now = time.monotonic()
+        if not force:
+            if now < retry_at:
+                return
+            if batch_count < batch_files and now - batch_started < max_batch_latency:
+                return
+        if transform_micro_batch(conn, transform_sql):
+            logger.info("[watch] transformed batch of %d file(s)", batch_count)
+            batch_count = 0
+            batch_started = None
+            transform_failures = 0
+            retry_at = 0.0
+            return
+        if force:
+            return
+        transform_failures += 1
+        if transform_failures >= max_retries:
+            raise RuntimeError(
+                f"transform failed {transform_failures} times in a row; stopping the watcher. "
+                "The failing rows are still in raw.*; fix them (or the transform) and re-run."
+            )
+        retry_at = now + max_batch_latency
+        logger.warning(
+            "[watch] retrying transform in %.0fs (attempt %d of %d)",
+            max_batch_latency, transform_failures + 1, max_retries,
+        )
+
+    def load_file(path: str, sig: tuple[int, int], table: str) -> bool:
+        try:
+            with conn.cursor() as cur:
+                copy_csv_stream(cur, table, sftp, path, encoding=encoding)
+                record_loaded_file(cur, path, sig)
+            conn.commit()
+        except (psycopg2.Error, OSError, paramiko.SSHException) as e:
+            if session_lost(conn, sftp):
+                logger.error("[watch] lost the DB/SSH session while loading %s; stopping.", path)
+                raise
+            conn.rollback()
+            load_failures[path] = load_failures.get(path, 0) + 1
+            if load_failures[path] >= max_retries:
+                logger.error(
+                    "[watch] giving up on %s after %d failed load(s): %s",
+                    path, load_failures[path], str(e).strip(),
+                )
+                # skipped for this run only; not recorded, so a restart tries it again
+                loaded[path] = sig
+            else:
+                logger.warning("[watch] failed to load %s, will retry: %s", path, str(e).strip())
+            return False
+        load_failures.pop(path, None)
+        loaded[path] = sig
+        return True
+
+    logger.info(
+        "[watch] polling %d director%s every %.0fs (Ctrl+C to stop)",
+        len(targets), "y" if len(targets) == 1 else "ies", poll_interval,
+    )
+    try:
+        while True:
+            for directory, table in targets:
+                for path, sig in poll_completed_csvs(sftp, directory, pending, loaded):
+                    logger.info("[watch] %s -> %s", path, table)
+                    if not load_file(path, sig, table):
+                        continue
+                    total += 1
+                    batch_count += 1
+                    if batch_started is None:
+                        batch_started = time.monotonic()
+                    flush()
+            flush()
+
+            delay = poll_interval
+            if transform_sql and batch_started is not None:
+                due = max(batch_started + max_batch_latency, retry_at)
+                delay = min(delay, max(0.0, due - time.monotonic()))
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        logger.info("[watch] stopping")
+        conn.rollback()
+        flush(force=True)
+
+    logger.info("[watch] loaded %d file(s)", total)
+    return total
+
+
+def add_load_args(ap: argparse.ArgumentParser) -> None:
+    """Add the loader flags (remote paths, table clearing, schema/transform files)."""
+    ap.add_argument("--remote-root", default=os.getenv("REMOTE_ROOT", "/home/moxy/simple_pipeline"))
     ap.add_argument("--users-subdir", default="data/user_data")
     ap.add_argument("--purchases-subdir", default="data/purchase_data")
 
@@ -171,36 +418,36 @@ def main():
     ap.add_argument("--apply-schema", metavar="SQL_FILE", help="Apply the given schema SQL file before loading.")
     ap.add_argument("--apply-transform", metavar="SQL_FILE", help="Run the given transform SQL file after loading.")
 
-    verbosity = ap.add_mutually_exclusive_group()
-    verbosity.add_argument("--verbose", action="store_true", help="Enable debug logging")
-    verbosity.add_argument("--quiet", action="store_true", help="Show warnings and errors only")
-
-    args = ap.parse_args()
+    ap.add_argument(
+        "--watch",
+        action="store_true",
+        help="After the initial load, keep the session open and stream new CSVs as they appear.",
+    )
+    ap.add_argument("--poll-interval", type=float, default=10.0, help="Seconds between directory polls in --watch mode.")
+    ap.add_argument("--batch-files", type=int, default=20, help="Transform once this many new files are loaded.")
+    ap.add_argument(
+        "--max-batch-latency",
+        type=float,
+        default=60.0,
+        help="Transform loaded files no later than this many seconds after the first one.",
+    )
+    ap.add_argument(
+        "--max-retries",
+        type=int,
+        default=3,
+        help="In --watch mode, attempts per file load and consecutive transform failures before giving up.",
+    )
 
-    # Configure logging
-    log_level = logging.INFO
-    if args.verbose:
-        log_level = logging.DEBUG
-    elif args.quiet:
-        log_level = logging.WARNING
-    logging.basicConfig(level=log_level, format="%(levelname)s %(message)s")
 
+def run_load(args: argparse.Namespace) -> None:
+    """Load remote CSVs into raw.*, optionally applying schema and transform SQL."""
     remote_root = args.remote_root.rstrip("/")
     users_dir = posixpath.join(remote_root, args.users_subdir.strip("/"))
     purchases_dir = posixpath.join(remote_root, args.purchases_subdir.strip("/"))
+    loaded_paths: dict[str, tuple[int, int]] = {}
 
     # Open combined session (DB tunnel + optional SFTP)
-    with open_remote_session(
-        ssh_host=args.ssh_host,
-        ssh_user=args.ssh_user,
-        ssh_password=args.ssh_password,
-        ssh_port=args.ssh_port,
-        db_name=args.db_name,
-        db_user=args.db_user,
-        db_pass=args.db_password,
-        db_port=args.db_port,
-        want_sftp=True,
-    ) as session:
+    with open_remote_session(**session_kwargs(args, want_sftp=True)) as session:
         conn = session.conn
         sftp = session.sftp
         did_transform = False
@@ -216,20 +463,49 @@ def main():
             truncate_public_tables(conn)
             truncate_raw_tables(conn)
 
+        targets = [(users_dir, "raw.users_raw"), (purchases_dir, "raw.purchases_raw")]
+
+        # In watch mode the first scan uses the same completeness check as later polls:
+        # files still being uploaded stay in `pending` and are picked up by the watcher.
+        # Files recorded in raw.loaded_files by earlier runs are skipped.
+        pending: dict[str, tuple[int, int]] = {}
+        initial_files: dict[str, List[tuple[str, tuple[int, int]]] | None] = {users_dir: None, purchases_dir: None}
+        if args.watch:
+            loaded_paths.update(load_manifest(conn))
+            logger.info("[watch] %d file(s) already loaded by earlier runs", len(loaded_paths))
+            for directory, _ in targets:
+                poll_completed_csvs(sftp, directory, pending, loaded_paths)
+            time.sleep(args.poll_interval)
+            for directory, _ in targets:
+                initial_files[directory] = poll_completed_csvs(sftp, directory, pending, loaded_paths)
+
         # Load users
         loaded_users = _load_directory_into_table(
-            conn, sftp, users_dir, "raw.users_raw"
+            conn, sftp, users_dir, "raw.users_raw",
+            files=initial_files[users_dir], loaded_paths=loaded_paths,
         )
 
         # Load purchases
         loaded_purchases = _load_directory_into_table(
-            conn, sftp, purchases_dir, "raw.purchases_raw"
+            conn, sftp, purchases_dir, "raw.purchases_raw",
+            files=initial_files[purchases_dir], loaded_paths=loaded_paths,
         )
 
-        # Optional: run transform SQL
-        did_transform = apply_sql_if_requested(
-            conn, args.apply_transform, label="transform"
-        )
+        # Optional: run transform SQL. In watch mode raw.* is cleared in the same transaction,
+        # so the first micro-batch only sees files that arrive later.
+        transform_sql = None
+        if args.watch:
+            transform_sql = read_sql_file(args.apply_transform, label="transform")
+            if transform_sql is not None:
+                logger.info("[transform] applying local %s", args.apply_transform)
+                if not transform_micro_batch(conn, transform_sql):
+                    raise RuntimeError("initial transform failed; raw.* rows were kept, see the error above.")
+                logger.info("[transform] applied")
+                did_transform = True
+        else:
+            did_transform = apply_sql_if_requested(
+                conn, args.apply_transform, label="transform"
+            )
 
         # Quick counts
         summarize_raw_counts(conn)
@@ -237,8 +513,52 @@ def main():
         if did_transform:
             summarize_public_counts(conn)
 
+        # Optional: keep streaming new files on the same session
+        if args.watch:
+            watch_directories(
+                conn,
+                sftp,
+                targets,
+                loaded=loaded_paths,
+                pending=pending,
+                transform_sql=transform_sql,
+                poll_interval=args.poll_interval,
+                batch_files=args.batch_files,
+                max_batch_latency=args.max_batch_latency,
+                max_retries=args.max_retries,
+            )
+            summarize_raw_counts(conn)
+            if did_transform:
+                summarize_public_counts(conn)
+
     logger.info("[done]")
 
 
+def run_transform(args: argparse.Namespace) -> None:
+    """Apply the transform SQL to data already in raw.* and report public counts."""
+    with open_remote_session(**session_kwargs(args)) as session:
+        conn = session.conn
+        if getattr(args, "clear_public", False):
+            truncate_public_tables(conn)
+        if apply_sql_if_requested(conn, args.sql, label="transform"):
+            summarize_public_counts(conn)
+
+    logger.info("[done]")
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Stream remote CSVs into Postgres via SSH tunnel.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    add_connection_args(ap)
+    add_load_args(ap)
+    add_verbosity_args(ap)
+
+    args = ap.parse_args()
+    configure_logging(args)
+    run_load(args)
+
+
 if __name__ == "__main__":
     main()
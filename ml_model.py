@@ -1,44 +1,27 @@
 # simple regression model & gradient boost model to predict user spend
 
+import argparse
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
+import pickle
+from config import add_connection_args, session_kwargs
 from helpers import open_remote_session, run_query
+import queries
 
-import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import GradientBoostingRegressor
+# pandas/sklearn/plotting are imported inside the functions that need them, so
+# `score` never loads matplotlib/seaborn and `--help` loads none of it.
 
-import seaborn as sns
+DEFAULT_MODEL_PATH = os.path.join("models", "spend_gbr.pkl")
 
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, mean_squared_error
 
-# lets us use .env file for secrets
-from dotenv import load_dotenv
-load_dotenv()
+def prepare_features(df_users, categories: dict | None = None):
+    """Return (X, y, categories) with the categorical columns one-hot encoded.
 
-# %% quick test query
-with open_remote_session(
-    ssh_host="10.10.219.8",
-    ssh_user="moxy",
-    ssh_password=os.environ["SSH_PASSWORD"],  # $env:SSH_PASSWORD="your-ssh-password"
-    db_name="ecommerce",
-    db_user="appuser",
-    db_pass="devpassword",
-    want_sftp=False,
-) as session:
-    conn = session.conn
+    `categories` maps each categorical column to its levels. Training passes None and gets
+    the levels it saw; scoring passes the saved levels so the same reference level is
+    dropped and the dummy columns line up with the model.
+    """
+    import pandas as pd
 
-    ## User Type Counts with Bar Chart visual
-    df_users = run_query(conn, """
-                            SELECT *
-                            FROM users;""", as_df=True, limit = None)
-    df_users.head()
-
-
-    print(len(df_users))
-    
     # ensure types
     df_users["total_spent"] = pd.to_numeric(df_users["total_spent"], errors="coerce")
     df_users["purchase_count"] = pd.to_numeric(df_users["purchase_count"], errors="coerce")
@@ -50,15 +33,61 @@ with open_remote_session(
     X = df_users.drop(columns=["total_spent"])
     y = df_users["total_spent"]
 
-    # one-hot encode categorical variables (user_type, last_device)
+    # pin categorical variables (user_type, last_device) to known levels, then one-hot encode
+    if categories is None:
+        categories = {
+            col: sorted(X[col].dropna().unique().tolist())
+            for col in X.select_dtypes(include=["object", "category"]).columns
+        }
+    for col, levels in categories.items():
+        unseen = X[col].notna() & ~X[col].isin(levels)
+        if unseen.any():
+            print(f"Warning: {int(unseen.sum())} row(s) have {col} values not seen in training")
+        X[col] = pd.Categorical(X[col], categories=levels)
     X = pd.get_dummies(X, drop_first=True)
+    return X, y, categories
+
+
+def train(
+    conn,
+    *,
+    charts_dir: str = "charts",
+    model_path: str = DEFAULT_MODEL_PATH,
+    show: bool = False,
+):
+    """Fit the linear and gradient boosting models, save charts and pickle the GBR model."""
+    import numpy as np
+    import pandas as pd
+    import matplotlib
+    if not show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.linear_model import LinearRegression
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import r2_score, mean_squared_error
+
+    def finish_plot():
+        if show:
+            plt.show()
+        plt.close()
+
+    os.makedirs(charts_dir, exist_ok=True)
+
+    ## User Type Counts with Bar Chart visual
+    df_users = run_query(conn, queries.ALL_USERS, as_df=True, limit = None)
+
+    print(len(df_users))
+
+    X, y, categories = prepare_features(df_users)
 
     print("Feature columns after encoding:\n", X.head()) # check features
 
     # training and test splits
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.3, random_state=42
-    )   
+    )
 
     # train lienar regression model
     model = LinearRegression()
@@ -84,8 +113,8 @@ with open_remote_session(
     plt.xlabel("Actual Spend")
     plt.ylabel("Predicted Spend")
     plt.title("Actual vs Predicted Spend")
-    plt.savefig("charts/ml_actual_vs_predicted.png")
-    plt.show()
+    plt.savefig(os.path.join(charts_dir, "ml_actual_vs_predicted.png"))
+    finish_plot()
 
     # plot Feature importance (coefficients)
     coef_df = pd.DataFrame({
@@ -96,62 +125,113 @@ with open_remote_session(
     plt.figure(figsize=(8,4))
     sns.barplot(x="Coefficient", y="Feature", data=coef_df)
     plt.title("Feature Importance (Linear Regression Coefficients)")
-    plt.savefig("charts/ml_feature_importance.png")
-    plt.show()
-
-
-    # train Gradient Boosting Regressor  
-    gbr = GradientBoostingRegressor(random_state=42)          
-    gbr.fit(X_train, y_train)                                 
-
-    # predict on test set  
-    y_pred_gbr = gbr.predict(X_test)                          
-
-    # evaluate  
-    mse_gbr = mean_squared_error(y_test, y_pred_gbr)         
-    r2_gbr = r2_score(y_test, y_pred_gbr)                     
-    print("\nGradient Boosting Regressor")                    
-    print("---------------------------")                        
-    print(f"MSE: {mse_gbr:.3f}")                              
-    print(f"R^2: {r2_gbr:.3f}")     
-
-    # plot actual vs Predicted (GBR)  
-    plt.figure()                                              
-    plt.scatter(y_test, y_pred_gbr, alpha=0.7)                
-    y_min, y_max = float(np.min(y_test)), float(np.max(y_test))  
-    plt.plot([y_min, y_max], [y_min, y_max], linestyle="--")  
-    plt.xlabel("Actual total_spent")                          
-    plt.ylabel("Predicted total_spent")                       
-    plt.title("Actual vs Predicted — Gradient Boosting")    
-    plt.savefig("charts/ml_gbr_actual_predicted.png")  
-    plt.show()                                                
-
-    # plot Residuals vs Predicted (GBR)  
-    res_gbr = y_test - y_pred_gbr                             
-    plt.figure()                                              
-    plt.scatter(y_pred_gbr, res_gbr, alpha=0.7)               
-    plt.axhline(0, linestyle="--")                            
-    plt.xlabel("Predicted total_spent (GBR)")                 
-    plt.ylabel("Residuals (y - y_hat)")                       
-    plt.title("Residuals vs Predicted — Gradient Boosting")   
-    plt.savefig("charts/ml_gbr_residual_predicted.png")
-    plt.show()                                                
-
-    # plot feature importance (GBR)  
-    fi = pd.Series(gbr.feature_importances_, index=X_train.columns)  
-    fi = fi.sort_values(ascending=True)                               
-    plt.figure()                                                      
-    plt.barh(fi.index, fi.values)                                     
-    plt.xlabel("Feature Importance")                                  
-    plt.title("Feature Importance — Gradient Boosting")     
-    plt.savefig("charts/ml_gbr_feature_importance.png")           
-    plt.tight_layout()                                                
-    plt.show()
-
-
-
-
+    plt.savefig(os.path.join(charts_dir, "ml_feature_importance.png"))
+    finish_plot()
 
 
+    # train Gradient Boosting Regressor
+    gbr = GradientBoostingRegressor(random_state=42)
+    gbr.fit(X_train, y_train)
 
+    # predict on test set
+    y_pred_gbr = gbr.predict(X_test)
 
+    # evaluate
+    mse_gbr = mean_squared_error(y_test, y_pred_gbr)
+    r2_gbr = r2_score(y_test, y_pred_gbr)
+    print("\nGradient Boosting Regressor")
+    print("---------------------------")
+    print(f"MSE: {mse_gbr:.3f}")
+    print(f"R^2: {r2_gbr:.3f}")
+
+    # plot actual vs Predicted (GBR)
+    plt.figure()
+    plt.scatter(y_test, y_pred_gbr, alpha=0.7)
+    y_min, y_max = float(np.min(y_test)), float(np.max(y_test))
+    plt.plot([y_min, y_max], [y_min, y_max], linestyle="--")
+    plt.xlabel("Actual total_spent")
+    plt.ylabel("Predicted total_spent")
+    plt.title("Actual vs Predicted — Gradient Boosting")
+    plt.savefig(os.path.join(charts_dir, "ml_gbr_actual_predicted.png"))
+    finish_plot()
+
+    # plot Residuals vs Predicted (GBR)
+    res_gbr = y_test - y_pred_gbr
+    plt.figure()
+    plt.scatter(y_pred_gbr, res_gbr, alpha=0.7)
+    plt.axhline(0, linestyle="--")
+    plt.xlabel("Predicted total_spent (GBR)")
+    plt.ylabel("Residuals (y - y_hat)")
+    plt.title("Residuals vs Predicted — Gradient Boosting")
+    plt.savefig(os.path.join(charts_dir, "ml_gbr_residual_predicted.png"))
+    finish_plot()
+
+    # plot feature importance (GBR)
+    fi = pd.Series(gbr.feature_importances_, index=X_train.columns)
+    fi = fi.sort_values(ascending=True)
+    plt.figure()
+    plt.barh(fi.index, fi.values)
+    plt.xlabel("Feature Importance")
+    plt.title("Feature Importance — Gradient Boosting")
+    plt.savefig(os.path.join(charts_dir, "ml_gbr_feature_importance.png"))
+    plt.tight_layout()
+    finish_plot()
+
+    # save the GBR model with its category levels and columns so `score` can rebuild the same matrix
+    if model_path:
+        os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+        with open(model_path, "wb") as f:
+            pickle.dump({"model": gbr, "categories": categories, "columns": list(X.columns)}, f)
+        print(f"\nSaved model to {model_path}")
+
+    return gbr
+
+
+def load_model(model_path: str = DEFAULT_MODEL_PATH) -> dict:
+    """Load a model saved by `train`; fails if the file is missing or predates saved categories."""
+    with open(model_path, "rb") as f:
+        saved = pickle.load(f)
+    if "categories" not in saved:
+        raise ValueError(f"{model_path} has no saved category levels; re-run train")
+    return saved
+
+
+def score(
+    conn,
+    *,
+    model_path: str = DEFAULT_MODEL_PATH,
+    output: str | None = None,
+    saved: dict | None = None,
+):
+    """Predict total_spent for every user with a model saved by `train` (or an already loaded `saved`)."""
+    if saved is None:
+        saved = load_model(model_path)
+
+    df_users = run_query(conn, queries.ALL_USERS, as_df=True, limit=None)
+    emails = df_users["email"]
+    X, y, _ = prepare_features(df_users, saved["categories"])
+    X = X.reindex(columns=saved["columns"], fill_value=0)
+
+    df_scores = X.assign(email=emails, total_spent=y)[["email", "total_spent"]]
+    df_scores["predicted_spent"] = saved["model"].predict(X)
+
+    if output:
+        df_scores.to_csv(output, index=False)
+        print(f"Wrote {len(df_scores)} prediction(s) to {output}")
+    else:
+        print(df_scores.head(20))
+    return df_scores
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Train the spend models and save charts.")
+    add_connection_args(ap)
+    ap.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    args = ap.parse_args()
+
+    with open_remote_session(**session_kwargs(args)) as session:
+        train(session.conn, model_path=args.model_path, show=True)
+
+
+if __name__ == "__main__":
+    main()
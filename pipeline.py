@@ -0,0 +1,108 @@
+import argparse
+import sys
+from config import add_connection_args, add_verbosity_args, configure_logging, session_kwargs
+
+# Example usage:
+# python .\pipeline.py load --apply-schema "database_setup.sql" --clear-tables
+# python .\pipeline.py transform
+# python .\pipeline.py analyze
+# python .\pipeline.py train
+# python .\pipeline.py score --output predictions.csv
+#
+# Each subcommand imports its own module inside its handler, so `--help` and the
+# load/transform jobs never pull in pandas, matplotlib or sklearn.
+
+
+def cmd_load(args: argparse.Namespace) -> int:
+    from import_data import run_load
+    run_load(args)
+    return 0
+
+
+def cmd_transform(args: argparse.Namespace) -> int:
+    from import_data import run_transform
+    run_transform(args)
+    return 0
+
+
+def cmd_analyze(args: argparse.Namespace) -> int:
+    from helpers import open_remote_session
+    from data_analysis import run_analysis
+    with open_remote_session(**session_kwargs(args)) as session:
+        run_analysis(session.conn, charts_dir=args.charts_dir, show=args.show)
+    return 0
+
+
+def cmd_train(args: argparse.Namespace) -> int:
+    from helpers import open_remote_session
+    from ml_model import train
+    with open_remote_session(**session_kwargs(args)) as session:
+        train(session.conn, charts_dir=args.charts_dir, model_path=args.model_path, show=args.show)
+    return 0
+
+
+def cmd_score(args: argparse.Namespace) -> int:
+    from helpers import open_remote_session
+    from ml_model import load_model, score
+    # load the model before opening the tunnel so a missing/stale model fails fast
+    saved = load_model(args.model_path)
+    with open_remote_session(**session_kwargs(args)) as session:
+        score(session.conn, output=args.output, saved=saved)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # import_data and ml_model keep their heavy imports inside functions, so this is cheap
+    from import_data import add_load_args
+    from ml_model import DEFAULT_MODEL_PATH
+
+    # Connection/logging flags are shared by every subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    add_connection_args(common)
+    add_verbosity_args(common)
+
+    ap = argparse.ArgumentParser(description="simple_pipeline: load, transform, analyze, train and score.")
+    sub = ap.add_subparsers(dest="command", required=True)
+    fmt = argparse.ArgumentDefaultsHelpFormatter
+
+    p = sub.add_parser("load", parents=[common], formatter_class=fmt,
+                       help="Stream remote CSVs into raw.* (optionally schema/transform).")
+    add_load_args(p)
+    p.set_defaults(func=cmd_load)
+
+    p = sub.add_parser("transform", parents=[common], formatter_class=fmt,
+                       help="Apply the transform SQL to raw.* data.")
+    p.add_argument("--sql", default="transform_data.sql", metavar="SQL_FILE")
+    p.add_argument("--clear-public", action="store_true", help="TRUNCATE public.* tables before transforming.")
+    p.set_defaults(func=cmd_transform)
+
+    p = sub.add_parser("analyze", parents=[common], formatter_class=fmt,
+                       help="Print summary tables and save charts.")
+    p.add_argument("--charts-dir", default="charts")
+    p.add_argument("--show", action="store_true", help="Display charts interactively.")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("train", parents=[common], formatter_class=fmt,
+                       help="Train the spend models, save charts and the GBR model.")
+    p.add_argument("--charts-dir", default="charts")
+    p.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    p.add_argument("--show", action="store_true", help="Display charts interactively.")
+    p.set_defaults(func=cmd_train)
+
+    p = sub.add_parser("score", parents=[common], formatter_class=fmt,
+                       help="Predict user spend with a trained model.")
+    p.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    p.add_argument("--output", metavar="CSV_FILE", help="Write predictions here instead of printing a preview.")
+    p.set_defaults(func=cmd_score)
+
+    return ap
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    configure_logging(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
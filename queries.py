@@ -0,0 +1,100 @@
+"""Named SQL used by the analysis scripts.
+
+Keeping the statements here lets `db_conn.py`, `data_analysis.py`, `ml_model.py`
+and `query_plans.py` share one copy, so the plans we check are the plans we run.
+"""
+
+# db_conn.py
+USERS_COUNT = "SELECT COUNT(*) FROM users;"
+PURCHASES_COUNT = "SELECT COUNT(*) FROM purchases;"
+SAMPLE_USERS = "SELECT * FROM users LIMIT 5;"
+
+USERS_BY_TYPE = """
+    SELECT user_type, COUNT(*) AS n
+    FROM users
+    GROUP BY user_type
+    ORDER BY n DESC;
+"""
+
+TOP_CATEGORIES = """
+    SELECT product_category, COUNT(*) AS n
+    FROM purchases
+    GROUP BY product_category
+    ORDER BY n DESC;
+"""
+
+FIRST_DAYS = """
+    SELECT purchase_date, COUNT(*) AS orders
+    FROM purchases
+    GROUP BY purchase_date
+    ORDER BY purchase_date
+    LIMIT 15;
+"""
+
+# data_analysis.py
+USER_TYPE_COUNTS = """
+    SELECT user_type, COUNT(*) AS count
+    FROM users
+    GROUP BY user_type
+    ORDER BY count DESC;
+"""
+
+TOP_SPENDERS = """
+    SELECT first_name, last_name, total_spent
+    FROM users
+    ORDER BY total_spent DESC
+    LIMIT 20;
+"""
+
+DEVICE_COUNTS = """
+    SELECT last_device, COUNT(*) as count
+    FROM users
+    GROUP BY last_device
+    ORDER BY count DESC;
+"""
+
+TOP_CATEGORY_REVENUE = """
+    SELECT product_category, SUM(total_price) AS sum_total_price
+    FROM purchases
+    GROUP BY product_category
+    ORDER BY sum_total_price DESC
+    LIMIT 5;
+"""
+
+MONTHLY_REVENUE = """
+    SELECT DATE_TRUNC('month', purchase_date)::date AS month,
+    SUM(COALESCE(total_price, 0)) AS revenue
+    FROM purchases
+    WHERE EXTRACT(YEAR FROM purchase_date) = 2023
+    OR EXTRACT(YEAR FROM purchase_date) =2024
+    GROUP BY month
+    ORDER BY month;
+"""
+
+SPENDING_DISTRIBUTION = """
+    SELECT COALESCE(total_spent, 0) AS total_spent
+    FROM users;
+"""
+
+# ml_model.py
+ALL_USERS = """
+    SELECT *
+    FROM users;
+"""
+
+# Name -> SQL for everything above; used by query_plans.py
+NAMED_QUERIES = {
+    "db_conn.users_count": USERS_COUNT,
+    "db_conn.purchases_count": PURCHASES_COUNT,
+    "db_conn.sample_users": SAMPLE_USERS,
+    "db_conn.users_by_type": USERS_BY_TYPE,
+    "db_conn.top_categories": TOP_CATEGORIES,
+    "db_conn.first_days": FIRST_DAYS,
+    "data_analysis.user_type_counts": USER_TYPE_COUNTS,
+    "data_analysis.top_spenders": TOP_SPENDERS,
+    "data_analysis.device_counts": DEVICE_COUNTS,
+    "data_analysis.top_category_revenue": TOP_CATEGORY_REVENUE,
+    "data_analysis.monthly_revenue": MONTHLY_REVENUE,
+    "data_analysis.spending_distribution": SPENDING_DISTRIBUTION,
+    "ml_model.all_users": ALL_USERS,
+}
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+from typing import TYPE_CHECKING, Any, Dict, List
+from config import add_connection_args, add_verbosity_args, configure_logging, session_kwargs
+from helpers import open_remote_session, split_sql_statements
+from queries import NAMED_QUERIES
+
+if TYPE_CHECKING:
+    import psycopg2.extensions
+
+# Example usage:
+# python .\query_plans.py --update-baseline        (record plans/timings)
+# python .\query_plans.py                          (compare against the baseline, exit 1 on regressions)
+
+logger = logging.getLogger(__name__)
+
+# VERBOSE makes each scan node report its "Schema", so raw.* and public.* tables are told apart
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) "
+
+
+def collect_queries(transform_path: str | None = "transform_data.sql") -> Dict[str, str]:
+    """Return name -> SQL for the analysis queries plus each statement in the transform file."""
+    named = dict(NAMED_QUERIES)
+    if transform_path and os.path.isfile(transform_path):
+        with open(transform_path, "r", encoding="utf-8") as f:
+            stmts = split_sql_statements(f.read())
+        base = os.path.basename(transform_path)
+        for i, stmt in enumerate(stmts, 1):
+            named[f"{base}#{i}"] = stmt
+    elif transform_path:
+        logger.warning("[plans] transform file not found: %s; skipping.", transform_path)
+    return named
+
+
+def sql_fingerprint(sql: str) -> str:
+    """Hash of the SQL with comments, extra whitespace and the trailing `;` removed."""
+    normalized = " ".join(" ".join(split_sql_statements(sql)).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def explain_query(conn: psycopg2.extensions.connection, sql: str) -> Dict[str, Any]:
+    """Run EXPLAIN ANALYZE on one statement and return the top-level JSON plan document.
+
+    The transaction is always rolled back, so INSERTs from the transform are measured
+    without changing any data.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute(EXPLAIN_PREFIX + sql.strip().rstrip(";"))
+            doc = cur.fetchone()[0]
+    finally:
+        conn.rollback()
+    if isinstance(doc, str):
+        doc = json.loads(doc)
+    return doc[0]
+
+
+def _walk(node: Dict[str, Any]):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def summarize_plan(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce an EXPLAIN JSON document to the fields we track between runs."""
+    root = doc["Plan"]
+    seq_scans = set()
+    relations = set()
+    subplans_removed = 0
+    for node in _walk(root):
+        rel = node.get("Relation Name")
+        if rel:
+            if node.get("Schema"):
+                rel = f"{node['Schema']}.{rel}"
+            relations.add(rel)
+            if node.get("Node Type") == "Seq Scan":
+                seq_scans.add(rel)
+        subplans_removed += int(node.get("Subplans Removed", 0))
+    return {
+        "execution_ms": float(doc.get("Execution Time", 0.0)),
+        "planning_ms": float(doc.get("Planning Time", 0.0)),
+        "root_node": root.get("Node Type"),
+        "seq_scans": sorted(seq_scans),
+        "relations": sorted(relations),
+        "subplans_removed": subplans_removed,
+        "shared_hit_blocks": int(root.get("Shared Hit Blocks", 0)),
+        "shared_read_blocks": int(root.get("Shared Read Blocks", 0)),
+    }
+
+
+def measure_query(
+    conn: psycopg2.extensions.connection,
+    sql: str,
+    *,
+    repeat: int = 3,
+) -> Dict[str, Any]:
+    """Explain a query `repeat` times; keep the last plan and the median execution time."""
+    runs = [summarize_plan(explain_query(conn, sql)) for _ in range(max(1, repeat))]
+    result = runs[-1]
+    result["execution_ms"] = statistics.median(r["execution_ms"] for r in runs)
+    result["planning_ms"] = statistics.median(r["planning_ms"] for r in runs)
+    return result
+
+
+def find_regressions(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    *,
+    latency_ratio: float = 1.5,
+    min_latency_ms: float = 5.0,
+) -> List[str]:
+    """Compare one query's summary against its baseline and describe anything that got worse.
+
+    Latency is only flagged when it is both `latency_ratio` times the baseline and at least
+    `min_latency_ms` slower, so sub-millisecond noise on small tables does not trip it.
+    """
+    problems: List[str] = []
+
+    new_seq = sorted(set(current["seq_scans"]) - set(baseline.get("seq_scans", [])))
+    if new_seq:
+        problems.append(f"new seq scan on {', '.join(new_seq)}")
+
+    base_removed = int(baseline.get("subplans_removed", 0))
+    if current["subplans_removed"] < base_removed:
+        problems.append(
+            f"partition pruning lost: subplans removed {base_removed} -> {current['subplans_removed']}"
+        )
+    new_rels = sorted(set(current["relations"]) - set(baseline.get("relations", [])))
+    if new_rels and baseline.get("relations"):
+        problems.append(f"scans relations not in baseline: {', '.join(new_rels)}")
+
+    base_ms = float(baseline.get("execution_ms", 0.0))
+    cur_ms = current["execution_ms"]
+    if cur_ms > base_ms * latency_ratio and cur_ms - base_ms >= min_latency_ms:
+        problems.append(f"latency {base_ms:.2f} ms -> {cur_ms:.2f} ms")
+
+    return problems
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, Dict[str, Any]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def run_checks(
+    conn: psycopg2.extensions.connection,
+    named: Dict[str, str],
+    baseline: Dict[str, Dict[str, Any]],
+    *,
+    repeat: int = 3,
+    latency_ratio: float = 1.5,
+    min_latency_ms: float = 5.0,
+) -> tuple[Dict[str, Dict[str, Any]], Dict[str, List[str]]]:
+    """Measure every named query; return (results, regressions by query name).
+
+    A query that fails to run is always reported, whether or not it has a baseline entry.
+    """
+    import psycopg2
+
+    results: Dict[str, Dict[str, Any]] = {}
+    regressions: Dict[str, List[str]] = {}
+    for name, sql in named.items():
+        try:
+            current = measure_query(conn, sql, repeat=repeat)
+        except psycopg2.Error as e:
+            logger.warning("[plans] %s failed: %s", name, str(e).strip())
+            regressions[name] = [f"query failed: {str(e).strip()}"]
+            continue
+        current["sql_hash"] = sql_fingerprint(sql)
+        results[name] = current
+        logger.info(
+            "[plans] %s: %.2f ms, seq scans: %s",
+            name, current["execution_ms"], ", ".join(current["seq_scans"]) or "none",
+        )
+        if name not in baseline:
+            logger.info("[plans] %s has no baseline entry", name)
+            continue
+        if baseline[name].get("sql_hash") != current["sql_hash"]:
+            # comparing timings of a different statement would be meaningless
+            regressions[name] = ["SQL changed since the baseline; re-baseline with --update-baseline"]
+            continue
+        problems = find_regressions(
+            current, baseline[name], latency_ratio=latency_ratio, min_latency_ms=min_latency_ms
+        )
+        if problems:
+            regressions[name] = problems
+    return results, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Capture EXPLAIN ANALYZE plans for the project's SQL and flag regressions against a baseline.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    add_connection_args(ap)
+
+    ap.add_argument("--baseline", default="query_baseline.json", help="JSON file holding baseline plans/timings.")
+    ap.add_argument("--update-baseline", action="store_true", help="Write the measured results as the new baseline.")
+    ap.add_argument(
+        "--allow-missing-baseline",
+        action="store_true",
+        help="Measure and exit 0 when the baseline file does not exist (otherwise exit 2).",
+    )
+    ap.add_argument("--transform", default="transform_data.sql", metavar="SQL_FILE", help="Transform SQL to include.")
+    ap.add_argument("--only", action="append", metavar="NAME", help="Only check the named query (repeatable).")
+    ap.add_argument("--repeat", type=int, default=3, help="Runs per query; the median execution time is kept.")
+    ap.add_argument("--latency-ratio", type=float, default=1.5, help="Flag queries slower than baseline * ratio.")
+    ap.add_argument("--min-latency-ms", type=float, default=5.0, help="Ignore slowdowns smaller than this.")
+
+    add_verbosity_args(ap)
+
+    args = ap.parse_args()
+    configure_logging(args)
+
+    all_named = collect_queries(args.transform)
+    named = all_named
+    if args.only:
+        unknown = [n for n in args.only if n not in named]
+        if unknown:
+            ap.error(f"unknown query name(s): {', '.join(unknown)}; choose from {', '.join(named)}")
+        named = {n: named[n] for n in args.only}
+
+    baseline = {} if args.update_baseline else load_baseline(args.baseline)
+    if not baseline and not args.update_baseline:
+        if not args.allow_missing_baseline:
+            logger.error("[plans] no baseline at %s; run with --update-baseline first.", args.baseline)
+            return 2
+        logger.warning("[plans] no baseline at %s; measuring only.", args.baseline)
+
+    with open_remote_session(**session_kwargs(args)) as session:
+        results, regressions = run_checks(
+            session.conn,
+            named,
+            baseline,
+            repeat=args.repeat,
+            latency_ratio=args.latency_ratio,
+            min_latency_ms=args.min_latency_ms,
+        )
+
+    if args.update_baseline:
+        if regressions:
+            for name, problems in regressions.items():
+                for p in problems:
+                    logger.error("[plans] %s: %s", name, p)
+            logger.error("[plans] baseline not written: %d queries failed", len(regressions))
+            return 1
+        # drop entries for queries that no longer exist
+        merged = {n: v for n, v in load_baseline(args.baseline).items() if n in all_named}
+        merged.update(results)
+        save_baseline(args.baseline, merged)
+        logger.info("[plans] baseline written to %s (%d queries)", args.baseline, len(results))
+        return 0
+
+    for name in sorted(set(baseline) - set(all_named)):
+        regressions[name] = ["in the baseline but no longer defined; re-baseline with --update-baseline"]
+
+    for name, problems in regressions.items():
+        for p in problems:
+            logger.error("[regression] %s: %s", name, p)
+    if regressions:
+        logger.error("[plans] %d queries regressed", len(regressions))
+        return 1
+    logger.info("[plans] %d queries checked, no regressions", len(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
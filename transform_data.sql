@@ -1,6 +1,9 @@
 -- USERS
+-- Later drops carry updated totals for existing emails, so upsert them. DISTINCT ON keeps
+-- one row per email (highest load_seq, i.e. the last one loaded) because DO UPDATE cannot
+-- touch a row twice.
 INSERT INTO users (email, first_name, last_name, user_type, total_spent, purchase_count, last_device)
-SELECT
+SELECT DISTINCT ON (NULLIF(email,''))
   NULLIF(email,''),
   NULLIF(first_name,''),
   NULLIF(last_name,''),
@@ -9,9 +12,17 @@ SELECT
   NULLIF(purchase_count,'')::INTEGER,
   NULLIF(last_device,'')
 FROM raw.users_raw
-WHERE NULLIF(email,'') IS NOT NULL;
+WHERE NULLIF(email,'') IS NOT NULL
+ORDER BY NULLIF(email,''), load_seq DESC
+ON CONFLICT (email) DO UPDATE SET
+  first_name     = EXCLUDED.first_name,
+  last_name      = EXCLUDED.last_name,
+  user_type      = EXCLUDED.user_type,
+  total_spent    = EXCLUDED.total_spent,
+  purchase_count = EXCLUDED.purchase_count,
+  last_device    = EXCLUDED.last_device;
 
--- PURCHASES
+-- PURCHASES (a transaction_id never changes, so repeats are skipped)
 INSERT INTO purchases (transaction_id, user_email, product_name, product_category, total_price, purchase_date)
 SELECT
   NULLIF(transaction_id,''),
@@ -28,4 +39,5 @@ SELECT
   TO_DATE(NULLIF(purchase_date,''), 'MM/DD/YYYY')
 FROM raw.purchases_raw
 WHERE NULLIF(transaction_id,'') IS NOT NULL
-  AND NULLIF(user_email,'')    IS NOT NULL;
\ No newline at end of file
+  AND NULLIF(user_email,'')    IS NOT NULL
+ON CONFLICT (transaction_id) DO NOTHING;
\ No newline at end of file